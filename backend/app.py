@@ -1,5 +1,6 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
+import io
 import sys
 import os
 
@@ -7,12 +8,28 @@ import os
 sys.path.insert(0, os.path.dirname(__file__))
 
 from grocery_assistant import GroceryAssistant
+import data_transfer
+from request_profiler import RequestProfiler
 
 app = Flask(__name__, static_folder='../frontend')
 CORS(app)
 
-# Initialize AI assistant with database
-assistant = GroceryAssistant("c34ee9824b16cec9a0837b7e66aad9f4", db_path='../data/grocery.db')
+# Initialize AI assistant with database (GROCERY_DB_PATH lets tools point it elsewhere)
+DB_PATH = os.environ.get('GROCERY_DB_PATH', '../data/grocery.db')
+assistant = GroceryAssistant("c34ee9824b16cec9a0837b7e66aad9f4", db_path=DB_PATH)
+
+# Opt-in request profiling: sample a fraction of all requests with PROFILE_SAMPLE_RATE
+# (0 to 1, e.g. 0.05 for 5%).
+# With PROFILE_ADMIN_TOKEN set, requests carrying it in X-Profile-Token can send
+# "X-Profile: 1" and use the admin endpoint; PROFILE_ALLOW_HEADER=1 trusts the
+# X-Profile header from any client (local development only)
+profiler = RequestProfiler(
+    output_dir='../data/profiles',
+    sample_rate=os.environ.get('PROFILE_SAMPLE_RATE', 0),
+    admin_token=os.environ.get('PROFILE_ADMIN_TOKEN'),
+    allow_header=os.environ.get('PROFILE_ALLOW_HEADER', '').lower() in ('1', 'true', 'yes')
+)
+profiler.init_app(app)
 
 # Serve frontend
 @app.route('/')
@@ -106,6 +123,22 @@ def spending_analysis():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/spending/timeseries', methods=['GET'])
+def spending_timeseries():
+    """Weekly or monthly spending per category from the rollup tables"""
+    try:
+        result = assistant.get_spending_timeseries(
+            granularity=request.args.get('granularity', 'month'),
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            category=request.args.get('category')
+        )
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/chat', methods=['POST'])
 def ai_chat():
     """General AI chat for any grocery questions"""
@@ -136,18 +169,82 @@ def mark_consumed():
         if not item_id:
             return jsonify({"error": "Item ID required"}), 400
         
-        # Update database
-        import sqlite3
-        conn = sqlite3.connect(assistant.db_path)
-        cursor = conn.cursor()
-        cursor.execute('UPDATE purchases SET consumed = 1 WHERE id = ?', (item_id,))
-        conn.commit()
-        conn.close()
+        # Update database and the cached inventory snapshot
+        assistant.mark_consumed(item_id)
         
         return jsonify({"status": "success", "message": "Item marked as consumed"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/export/<table>', methods=['GET'])
+def export_data(table):
+    """Stream a table as CSV or NDJSON without loading it into memory"""
+    fmt = request.args.get('format', 'csv')
+    try:
+        chunks = data_transfer.export_table(assistant.db_path, table, fmt)
+        # Validate table/format before the response starts streaming
+        first = next(chunks, '')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    def generate():
+        yield first
+        yield from chunks
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=data_transfer.FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename={table}.{fmt}"}
+    )
+
+@app.route('/api/import/<table>', methods=['POST'])
+def import_data(table):
+    """Stream CSV or NDJSON request body into a table in batched transactions"""
+    try:
+        fmt = request.args.get('format', 'csv')
+        lines = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+        imported = data_transfer.import_table(assistant.db_path, table, lines, fmt)
+        return jsonify({"status": "success", "table": table, "imported": imported})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        # Batches committed before a failure are already in the table
+        if table == 'purchases':
+            assistant.invalidate_inventory()
+
+@app.route('/api/admin/profiling', methods=['GET'])
+def profiling_report():
+    """Top cumulative functions across recent profiled requests"""
+    if not profiler.is_admin(request.headers):
+        return jsonify({"error": "Profiling admin token required"}), 403
+    try:
+        report = profiler.top_functions(
+            limit=request.args.get('limit', 20, type=int),
+            endpoint=request.args.get('endpoint'),
+            recent=request.args.get('recent', 50, type=int)
+        )
+        return jsonify({**profiler.status(), **report})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/profiling', methods=['POST'])
+def configure_profiling():
+    """Turn profiling of every request on/off or change the sample rate"""
+    if not profiler.is_admin(request.headers):
+        return jsonify({"error": "Profiling admin token required"}), 403
+    try:
+        data = request.json or {}
+        profiler.configure(enabled=data.get('enabled'), sample_rate=data.get('sample_rate'))
+        return jsonify(profiler.status())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 if __name__ == '__main__':
     print("\n" + "="*60)
     print("🚀 STARTING AI-POWERED GROCERY ASSISTANT")
@@ -0,0 +1,191 @@
+from datetime import datetime
+import argparse
+import csv
+import io
+import itertools
+import json
+import sqlite3
+import sys
+
+import spending_rollups
+
+# Tables that can be moved in and out, with their columns in schema order
+TABLE_COLUMNS = {
+    "purchases": ["id", "item_name", "category", "quantity", "unit_price",
+                  "purchase_date", "expiry_date", "consumed"],
+    "shopping_lists": ["id", "item_name", "quantity", "priority", "added_date", "completed"],
+    "ai_logs": ["id", "query_type", "user_input", "ai_response", "timestamp"]
+}
+
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson"
+}
+
+EXPORT_CHUNK_ROWS = 5000
+IMPORT_BATCH_ROWS = 50000
+
+
+def _check(table, fmt):
+    if table not in TABLE_COLUMNS:
+        raise ValueError(f"Unknown table: {table}. Use one of: {', '.join(TABLE_COLUMNS)}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt}. Use one of: {', '.join(FORMATS)}")
+
+
+def iter_row_chunks(db_path, table, chunk_size=EXPORT_CHUNK_ROWS):
+    """Yield lists of row tuples from a table, holding one chunk in memory at a time"""
+    columns = TABLE_COLUMNS[table]
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT {", ".join(columns)} FROM {table} ORDER BY id')
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+
+def export_table(db_path, table, fmt="csv", chunk_size=EXPORT_CHUNK_ROWS):
+    """Stream a table as CSV or NDJSON text, one chunk of rows per yielded string"""
+    _check(table, fmt)
+    columns = TABLE_COLUMNS[table]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    if fmt == "csv":
+        writer.writerow(columns)
+
+    for rows in iter_row_chunks(db_path, table, chunk_size):
+        if fmt == "csv":
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                buffer.write(json.dumps(dict(zip(columns, row))))
+                buffer.write("\n")
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    # Header-only CSV for an empty table
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _iter_records(lines, fmt):
+    """Parse a text stream into dicts without reading it all at once"""
+    if fmt == "csv":
+        for record in csv.DictReader(lines):
+            # CSV has no NULL, so empty cells become NULL again
+            yield {key: (value if value != "" else None) for key, value in record.items()}
+    else:
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _check_purchase(record, number):
+    """Reject purchases the read paths cannot parse"""
+    if not record.get("item_name"):
+        raise ValueError(f"Record {number}: item_name is required")
+    for column in ("purchase_date", "expiry_date"):
+        value = record.get(column)
+        try:
+            datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Record {number}: {column} must be an ISO date, got {value!r}")
+
+
+def import_table(db_path, table, lines, fmt="csv", batch_size=IMPORT_BATCH_ROWS):
+    """Insert records from a CSV/NDJSON text stream in large batched transactions"""
+    _check(table, fmt)
+    # Source ids are dropped so imported rows never collide with existing ones
+    allowed = [column for column in TABLE_COLUMNS[table] if column != "id"]
+    records = _iter_records(lines, fmt)
+
+    first = next(records, None)
+    if first is None:
+        return 0
+    if not any(column in first for column in allowed):
+        raise ValueError(f"No {table} columns found in input")
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    imported = 0
+    pending = 0
+    # Consecutive records with the same non-NULL columns share one executemany;
+    # NULL and missing columns are left out so the table defaults apply
+    run_columns, run = None, []
+
+    def flush_run():
+        if run:
+            cursor.executemany(
+                f'INSERT INTO {table} ({", ".join(run_columns)}) '
+                f'VALUES ({", ".join("?" for _ in run_columns)})',
+                run
+            )
+
+    try:
+        for number, record in enumerate(itertools.chain([first], records), start=1):
+            if table == "purchases":
+                _check_purchase(record, number)
+            columns = tuple(column for column in allowed if record.get(column) is not None)
+            if columns != run_columns:
+                flush_run()
+                run_columns, run = columns, []
+            run.append(tuple(record[column] for column in columns))
+            pending += 1
+            if pending >= batch_size:
+                flush_run()
+                run = []
+                conn.commit()
+                imported += pending
+                pending = 0
+        flush_run()
+        conn.commit()
+        imported += pending
+    finally:
+        # One grouped pass is cheaper than upserting rollups row by row. It also
+        # runs when a later batch fails, so committed batches are never left out.
+        if table == "purchases" and imported:
+            conn.rollback()
+            spending_rollups.create_tables(cursor)
+            spending_rollups.rebuild(cursor)
+            conn.commit()
+        conn.close()
+
+    print(f"✓ Imported {imported} rows into {table}")
+    return imported
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream grocery data in and out of SQLite")
+    parser.add_argument("action", choices=["export", "import"])
+    parser.add_argument("table", choices=list(TABLE_COLUMNS))
+    parser.add_argument("--format", choices=list(FORMATS), default="csv")
+    parser.add_argument("--db", default="data/grocery.db", help="SQLite database path")
+    parser.add_argument("--file", help="Output/input file (defaults to stdout/stdin)")
+    args = parser.parse_args(argv)
+
+    if args.action == "export":
+        out = open(args.file, "w", newline="", encoding="utf-8") if args.file else sys.stdout
+        try:
+            for chunk in export_table(args.db, args.table, args.format):
+                out.write(chunk)
+        finally:
+            if args.file:
+                out.close()
+    else:
+        src = open(args.file, newline="", encoding="utf-8") if args.file else sys.stdin
+        try:
+            import_table(args.db, args.table, src, args.format)
+        finally:
+            if args.file:
+                src.close()
+
+
+if __name__ == "__main__":
+    main()
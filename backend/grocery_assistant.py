@@ -3,12 +3,47 @@ from datetime import datetime, timedelta
 import json
 import sqlite3
 import os
+import threading
+
+import inventory_snapshot
+from prompt_context import PromptContextBuilder, NO_THINK_SUFFIX
+import spending_rollups
+from similarity_index import SimilarityIndex
 
 class GroceryAssistant:
-    def __init__(self, api_key, db_path='data/grocery.db'):
+    # Token budget for the inventory context packed into each prompt type
+    PROMPT_TOKEN_BUDGETS = {
+        "predict_missing": 120,
+        "expiring_items": 100,
+        "shopping_list": 60,
+        "meal_planning": 60,
+        "chat": 160
+    }
+
+    # Minimum cosine similarity to trust the local catalogue instead of the model,
+    # and the lead the best match needs over a runner-up that would answer differently.
+    # Calibrated on catalog_eval.json (run: python similarity_index.py 0.15)
+    CATEGORY_CONFIDENCE = 0.5
+    ALTERNATIVES_CONFIDENCE = 0.75
+    ALTERNATIVES_FALLBACK_CONFIDENCE = 0.5
+    CATALOG_MARGIN = 0.15
+
+    # Rows kept per view in the in-memory inventory snapshot
+    INVENTORY_SNAPSHOT_ROWS = 500
+
+    def __init__(self, api_key, db_path='data/grocery.db', disable_reasoning=True):
         self.sdk = Bytez(api_key)
         self.model = self.sdk.model("Qwen/Qwen3-0.6B")
         self.db_path = db_path
+        self.disable_reasoning = disable_reasoning
+        self.prompt_stats = {}
+        self.catalog_index = SimilarityIndex.from_catalog()
+        # Bumped on every purchases write; the snapshot is rebuilt when it falls behind
+        self.inventory_version = 0
+        # Last purchases_version counter this process has accounted for
+        self.inventory_data_version = None
+        self.inventory = None
+        self.inventory_lock = threading.Lock()
         self.init_database()
     
     def init_database(self):
@@ -54,6 +89,17 @@ class GroceryAssistant:
             )
         ''')
         
+        # Weekly/monthly spending per category, kept up to date on insert
+        spending_rollups.create_tables(cursor)
+        
+        # Write counter that lets the inventory snapshot notice writes from other processes
+        inventory_snapshot.create_tables(cursor)
+        
+        # Backfill rollups for databases created before they existed, and repair any that drifted
+        if spending_rollups.mismatches(cursor):
+            spending_rollups.rebuild(cursor)
+            print("✓ Spending rollups rebuilt")
+        
         conn.commit()
         conn.close()
         print("✓ Database initialized")
@@ -61,6 +107,9 @@ class GroceryAssistant:
     def _call_ai_model(self, prompt):
         """Unified AI model caller with proper error handling"""
         try:
+            # Ask Qwen3 to skip the <think> section we would throw away anyway
+            if self.disable_reasoning:
+                prompt = f"{prompt}\n{NO_THINK_SUFFIX}"
             response = self.model.run([{"role": "user", "content": prompt}])
             
             # Debug logging
@@ -124,14 +173,29 @@ class GroceryAssistant:
             INSERT INTO purchases (item_name, category, quantity, unit_price, purchase_date, expiry_date)
             VALUES (?, ?, ?, ?, ?, ?)
         ''', (item_name, category, quantity, unit_price, purchase_date, expiry_date))
+        item_id = cursor.lastrowid
+        spending_rollups.record_purchase(cursor, item_id)
+        
+        # Patch the snapshot with the row as stored, not the raw request values
+        cursor.execute(
+            f'SELECT {", ".join(inventory_snapshot.PURCHASE_COLUMNS)} FROM purchases WHERE id = ?', (item_id,)
+        )
+        stored = cursor.fetchone()
+        written = inventory_snapshot.data_version(cursor)
         
         conn.commit()
         conn.close()
+        self._inventory_changed(lambda inventory: inventory.add(stored), written - 1, written)
         print(f"✓ Added {item_name} ({category}) to database")
         return {"status": "success", "item": item_name, "category": category}
     
     def _ai_categorize_item(self, item_name):
-        """Use AI to categorize grocery item"""
+        """Categorize from the local catalogue, falling back to AI for unknown items"""
+        match, score = self.catalog_index.nearest(item_name, self.CATEGORY_CONFIDENCE, self.CATALOG_MARGIN)
+        if match:
+            print(f"Catalogue match for {item_name}: {match['name']} ({score:.2f})")
+            return match['category']
+        
         prompt = f"""Categorize this grocery item into ONE category only: "{item_name}"
 
 Categories: Produce, Dairy, Meat, Bakery, Pantry, Beverages, Snacks, Frozen, Other
@@ -175,20 +239,77 @@ Respond with ONLY the category name, nothing else."""
             })
         return result
     
+    def get_inventory(self):
+        """Shared inventory snapshot, reloaded from SQLite only after a write"""
+        with self.inventory_lock:
+            # One primary key lookup catches writes from other processes (e.g. the import CLI)
+            conn = sqlite3.connect(self.db_path)
+            data_version = inventory_snapshot.data_version(conn.cursor())
+            conn.close()
+            if data_version != self.inventory_data_version:
+                self.inventory_data_version = data_version
+                self.inventory_version += 1
+            if self.inventory is None or self.inventory.version != self.inventory_version:
+                self.inventory = inventory_snapshot.InventorySnapshot.load(
+                    self.db_path, self.inventory_version, self.INVENTORY_SNAPSHOT_ROWS
+                )
+            return self.inventory
+    
+    def _inventory_changed(self, patch=None, data_version_before=None, data_version_after=None):
+        """Bump the inventory version, patching the snapshot in place when it is current.
+        
+        The data versions bracket this process's own write; when nothing else wrote
+        in between, the counter moves on without forcing a reload.
+        """
+        with self.inventory_lock:
+            current = self.inventory is not None and self.inventory.version == self.inventory_version
+            self.inventory_version += 1
+            if data_version_before is not None and self.inventory_data_version == data_version_before:
+                self.inventory_data_version = data_version_after
+            # A patch that cannot keep the snapshot exact leaves it stale, so the next read reloads
+            if patch and current and patch(self.inventory):
+                self.inventory.version = self.inventory_version
+    
+    def invalidate_inventory(self):
+        """Force the next read to reload the inventory, e.g. after a bulk import"""
+        self._inventory_changed()
+    
+    def mark_consumed(self, item_id):
+        """Mark a purchase as consumed"""
+        item_id = int(item_id)
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('UPDATE purchases SET consumed = 1 WHERE id = ?', (item_id,))
+        updated = cursor.rowcount
+        written = inventory_snapshot.data_version(cursor)
+        conn.commit()
+        conn.close()
+        self._inventory_changed(lambda inventory: inventory.mark_consumed(item_id), written - updated, written)
+    
+    def _build_context(self, prompt_type, rows, formatter, separator="\n", builder=None):
+        """Pack the most relevant rows into the prompt type's token budget, returning (text, rows packed)"""
+        builder = builder or PromptContextBuilder()
+        text, stats = builder.build(rows, formatter, self.PROMPT_TOKEN_BUDGETS[prompt_type], separator)
+        self.prompt_stats[prompt_type] = stats
+        print(f"Context {prompt_type}: {stats['packed']}/{stats['candidates']} rows, "
+              f"{stats['tokens_before']} -> {stats['tokens_after']} tokens")
+        return text, stats['packed']
+    
     def predict_missing_items(self):
         """AI predicts missing items based on REAL purchase history from database"""
-        purchases = self.get_all_purchases()
+        purchases = self.get_inventory().recent()
         
         if not purchases:
             return "No purchase history available. Start adding items to get AI predictions!"
         
-        # Build simplified context (limit items)
-        recent_items = []
-        for p in purchases[:10]:
-            days_ago = (datetime.now() - datetime.fromisoformat(p['purchase_date'])).days
-            recent_items.append(f"{p['item_name']} - {days_ago} days ago")
-        
-        items_text = "\n".join(recent_items)
+        # One row per item, most relevant first, packed into the token budget
+        builder = PromptContextBuilder()
+        candidates = builder.rank(builder.group_by_item(purchases))
+        items_text, _ = self._build_context(
+            "predict_missing", candidates,
+            lambda p: f"{p['item_name']} x{p['times_bought']}, {builder.days_since(p['purchased_at'])}d ago",
+            builder=builder
+        )
         
         prompt = f"""Recent grocery purchases:
 {items_text}
@@ -215,8 +336,9 @@ Based on this, suggest 5 items the user should buy again. For each item explain
     def _basic_prediction(self, purchases):
         """Fallback: Basic prediction without AI"""
         old_items = []
+        now = datetime.now()
         for p in purchases:
-            days_ago = (datetime.now() - datetime.fromisoformat(p['purchase_date'])).days
+            days_ago = (now - p['purchased_at']).days
             if days_ago >= 7:
                 old_items.append(f"• {p['item_name']} (purchased {days_ago} days ago)")
         
@@ -234,6 +356,14 @@ These items were purchased over a week ago and might need restocking."""
         if not item_name or item_name.strip() == '':
             return "Please provide an item name to find alternatives for."
         
+        # Well-known items are answered from the local catalogue without a model call
+        match, score = self.catalog_index.nearest(
+            item_name, self.ALTERNATIVES_CONFIDENCE, self.CATALOG_MARGIN, field='swaps'
+        )
+        if match and match['swaps']:
+            print(f"Catalogue match for {item_name}: {match['name']} ({score:.2f})")
+            return self._format_swaps(item_name, match['swaps'])
+        
         # Get purchase history of this item
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
@@ -262,25 +392,22 @@ For each alternative, briefly explain the health benefits."""
         self._log_ai_interaction("healthy_alternatives", item_name, output)
         return f"🥗 HEALTHIER OPTIONS FOR '{item_name}':\n\n{output}"
     
-    def _basic_alternatives(self, item_name):
-        """Fallback: Basic alternatives suggestions"""
-        common_swaps = {
-            'bread': 'whole grain bread, multigrain bread, sourdough',
-            'milk': 'almond milk, oat milk, low-fat milk',
-            'sugar': 'honey, stevia, maple syrup',
-            'soda': 'sparkling water, coconut water, herbal tea',
-            'chips': 'veggie chips, popcorn, nuts',
-            'white rice': 'brown rice, quinoa, cauliflower rice'
-        }
-        
-        for key, alternatives in common_swaps.items():
-            if key in item_name.lower():
-                return f"""🥗 HEALTHIER ALTERNATIVES FOR '{item_name}':
+    def _format_swaps(self, item_name, swaps):
+        """Format catalogue swaps the same way as the basic alternatives"""
+        return f"""🥗 HEALTHIER ALTERNATIVES FOR '{item_name}':
 
 Consider these options:
-• {alternatives.replace(', ', chr(10) + '• ')}
+• {(chr(10) + '• ').join(swaps)}
 
 These alternatives typically offer better nutrition with more fiber, vitamins, or less processing."""
+    
+    def _basic_alternatives(self, item_name):
+        """Fallback: Basic alternatives suggestions"""
+        match, _ = self.catalog_index.nearest(
+            item_name, self.ALTERNATIVES_FALLBACK_CONFIDENCE, self.CATALOG_MARGIN, field='swaps'
+        )
+        if match and match['swaps']:
+            return self._format_swaps(item_name, match['swaps'])
         
         return f"""🥗 For '{item_name}', consider:
 
@@ -293,31 +420,19 @@ Add prices to your purchases for personalized budget-friendly suggestions!"""
     
     def check_expiring_items(self):
         """AI analyzes REAL expiring items from database and suggests recipes"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         # Get items expiring in next 3 days
-        three_days_later = (datetime.now() + timedelta(days=3)).isoformat()
-        cursor.execute('''
-            SELECT item_name, category, quantity, expiry_date 
-            FROM purchases 
-            WHERE expiry_date <= ? AND consumed = 0
-            ORDER BY expiry_date
-        ''', (three_days_later,))
-        
-        expiring = cursor.fetchall()
-        conn.close()
+        builder = PromptContextBuilder(recency_weight=0.0, frequency_weight=0.0)
+        expiring = self.get_inventory().expiring(days=3, now=builder.now)
         
         if not expiring:
             return "✓ Great! No items expiring in the next 3 days."
         
-        # Build detailed context (limit to prevent too long prompts)
-        expiring_details = []
-        for item in expiring[:10]:  # Limit to 10 items
-            days_left = (datetime.fromisoformat(item[3]) - datetime.now()).days
-            expiring_details.append(f"- {item[0]} ({item[1]}) - {days_left} days left")
-        
-        expiring_text = "\n".join(expiring_details)
+        # Most urgent items first, packed into the token budget
+        expiring_text, _ = self._build_context(
+            "expiring_items", builder.rank(expiring),
+            lambda p: f"- {p['item_name']} ({p['category']}) {builder.days_until(p['expires_at'])}d left",
+            builder=builder
+        )
         
         prompt = f"""These grocery items are expiring soon:
 {expiring_text}
@@ -341,12 +456,15 @@ Provide 2-3 quick recipe ideas using these items. Be concise and practical."""
         if not items_to_add:
             return "No items provided for shopping list."
         
-        # Get current inventory (limit to prevent long prompts)
-        purchases = self.get_all_purchases()
-        current_items = [p['item_name'] for p in purchases[:20] if not p['consumed']]
+        # Get current inventory, most relevant items first within the token budget
+        builder = PromptContextBuilder()
+        current_items = builder.rank(builder.group_by_item(self.get_inventory().fresh(builder.now)))
         
         items_text = ', '.join(items_to_add)
-        current_text = ', '.join(current_items[:10]) if current_items else 'None'
+        current_text, _ = self._build_context(
+            "shopping_list", current_items, lambda p: p['item_name'], separator=", ", builder=builder
+        )
+        current_text = current_text or 'None'
         
         prompt = f"""Create a shopping list for: {items_text}
 
@@ -394,23 +512,23 @@ Total items: {len(items)}
     
     def meal_planning_suggestions(self):
         """AI generates meal plans based on REAL current inventory"""
-        purchases = self.get_all_purchases()
+        inventory = self.get_inventory()
         
-        if not purchases:
+        if not inventory.recent():
             return "No items in your inventory. Add purchases to get meal suggestions!"
         
-        # Get fresh items (not expired, not consumed) - limit to 10
-        available_items = []
-        for p in purchases:
-            if not p['consumed'] and datetime.fromisoformat(p['expiry_date']) > datetime.now():
-                available_items.append(p['item_name'])
-                if len(available_items) >= 10:
-                    break
+        # Get fresh items (not expired, not consumed), use-soon items first
+        builder = PromptContextBuilder(recency_weight=0.5)
+        fresh = inventory.fresh(builder.now)
         
-        if not available_items:
+        if not fresh:
             return "No fresh items available for meal planning. Add some groceries first!"
         
-        items_text = ", ".join(available_items)
+        ranked = builder.rank(builder.group_by_item(fresh))
+        items_text, packed = self._build_context(
+            "meal_planning", ranked, lambda p: p['item_name'], separator=", ", builder=builder
+        )
+        available_items = [p['item_name'] for p in ranked[:packed]]
         
         prompt = f"""Available ingredients: {items_text}
 
@@ -459,11 +577,10 @@ DINNER IDEAS:
         if not user_query or user_query.strip() == '':
             return "Please ask a question about your groceries."
         
-        purchases = self.get_all_purchases()
+        purchases = self.get_inventory().recent()
         
-        # Limit context to prevent too long prompts
         if purchases:
-            context = self._build_purchase_summary(purchases[:10])
+            context = self._build_purchase_summary(purchases)
         else:
             context = "No purchase history yet."
         
@@ -486,14 +603,52 @@ Provide a helpful response."""
         self._log_ai_interaction("chat", user_query, output)
         return output
     
+    def rebuild_spending_rollups(self):
+        """Recompute weekly and monthly spending rollups from all purchases"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        spending_rollups.rebuild(cursor)
+        conn.commit()
+        conn.close()
+        print("✓ Spending rollups rebuilt")
+    
+    def get_spending_timeseries(self, granularity='month', start=None, end=None, category=None):
+        """Spending per category per week/month, read from the rollup table"""
+        if granularity not in spending_rollups.GRANULARITIES:
+            raise ValueError(f"granularity must be one of: {', '.join(spending_rollups.GRANULARITIES)}")
+        
+        # Default range: the last 12 periods up to today
+        end = spending_rollups.period_start(end or datetime.now(), granularity)
+        if start:
+            start = spending_rollups.period_start(start, granularity)
+        elif granularity == 'week':
+            start = (datetime.fromisoformat(end) - timedelta(weeks=11)).date().isoformat()
+        else:
+            end_date = datetime.fromisoformat(end)
+            month_index = end_date.year * 12 + end_date.month - 1 - 11
+            start = f"{month_index // 12:04d}-{month_index % 12 + 1:02d}-01"
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        series = spending_rollups.query(cursor, granularity, start, end, category)
+        conn.close()
+        
+        return {
+            "granularity": granularity,
+            "start": start,
+            "end": end,
+            "series": series
+        }
+    
     def get_spending_analysis(self):
         """AI analyzes spending patterns from database"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
-        cursor.execute('SELECT category, SUM(unit_price * quantity) as total FROM purchases WHERE unit_price IS NOT NULL GROUP BY category')
+        # Monthly rollups cover every priced purchase, so totals come from there
+        cursor.execute("SELECT category, SUM(total) FROM spending_rollups WHERE granularity = 'month' GROUP BY category")
         spending = cursor.fetchall()
         
-        cursor.execute('SELECT COUNT(*), SUM(unit_price * quantity) FROM purchases WHERE unit_price IS NOT NULL')
+        cursor.execute("SELECT SUM(items), SUM(total) FROM spending_rollups WHERE granularity = 'month'")
         totals = cursor.fetchone()
         conn.close()
         
@@ -538,18 +693,18 @@ Total: ${total_spent:.2f}
 {output}"""
     
     def _build_purchase_summary(self, purchases):
-        """Build a comprehensive summary for AI context"""
+        """Build a compact, token-budgeted summary for AI context"""
         if not purchases:
             return "No purchase history."
         
-        summary_lines = []
-        for p in purchases[:20]:  # Last 20 purchases
-            days_ago = (datetime.now() - datetime.fromisoformat(p['purchase_date'])).days
-            summary_lines.append(
-                f"- {p['item_name']} ({p['category']}) - {days_ago} days ago, expires in {(datetime.fromisoformat(p['expiry_date']) - datetime.now()).days} days"
-            )
-        
-        return "\n".join(summary_lines)
+        builder = PromptContextBuilder()
+        summary, _ = self._build_context(
+            "chat", builder.rank(builder.group_by_item(purchases)),
+            lambda p: f"- {p['item_name']} ({p['category']}) x{p['times_bought']}, "
+                      f"{builder.days_since(p['purchased_at'])}d ago, exp {builder.days_until(p['expires_at'])}d",
+            builder=builder
+        )
+        return summary
     
     def _log_ai_interaction(self, query_type, user_input, ai_response):
         """Log AI interactions to database for learning"""
@@ -589,7 +744,8 @@ Total: ${total_spent:.2f}
             "total_items": total_items,
             "categories": categories,
             "consumed_items": consumed,
-            "active_items": total_items - consumed
+            "active_items": total_items - consumed,
+            "prompt_context": self.prompt_stats
         }
 
 
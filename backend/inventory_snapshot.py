@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta
+import sqlite3
+
+PURCHASE_COLUMNS = ["id", "item_name", "category", "quantity", "unit_price",
+                    "purchase_date", "expiry_date", "consumed"]
+
+
+def create_tables(cursor):
+    """Counter bumped by triggers on every purchases write, from any connection or process"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS purchases_version (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            version INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO purchases_version (id, version) VALUES (0, 0)')
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS purchases_version_{event.lower()}
+            AFTER {event} ON purchases
+            BEGIN
+                UPDATE purchases_version SET version = version + 1 WHERE id = 0;
+            END
+        ''')
+
+
+def data_version(cursor):
+    """Current purchases write counter, a single primary key lookup"""
+    cursor.execute('SELECT version FROM purchases_version WHERE id = 0')
+    return cursor.fetchone()[0]
+
+
+def _row(values):
+    row = dict(zip(PURCHASE_COLUMNS, values))
+    # Parse once here instead of on every read path
+    row['purchased_at'] = datetime.fromisoformat(row['purchase_date'])
+    row['expires_at'] = datetime.fromisoformat(row['expiry_date'])
+    return row
+
+
+def _by_expiry(rows):
+    return sorted(rows, key=lambda r: r['expiry_date'])
+
+
+class InventorySnapshot:
+    """Bounded in-memory copy of recent and unconsumed purchases for the AI read paths"""
+
+    # Each view holds at most max_rows and is loaded by its own query, so a pile of
+    # expired rows can never crowd fresh ones out. Views are replaced rather than
+    # mutated, so readers can keep iterating a view while a writer patches the snapshot.
+    def __init__(self, recent, fresh, expired, version, max_rows, loaded_at):
+        self.version = version
+        self.max_rows = max_rows
+        self.loaded_at = loaded_at
+        self._recent = recent
+        self._fresh = fresh
+        self._expired = expired
+
+    @classmethod
+    def load(cls, db_path, version, max_rows=500, now=None):
+        now = now or datetime.now()
+        columns = ", ".join(PURCHASE_COLUMNS)
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT {columns} FROM purchases ORDER BY purchase_date DESC LIMIT ?', (max_rows,))
+        recent = [_row(values) for values in cursor.fetchall()]
+        # Soonest expiry first, so the head of this view is the upcoming expiring window
+        cursor.execute(f'''
+            SELECT {columns} FROM purchases
+            WHERE consumed = 0 AND expiry_date > ?
+            ORDER BY expiry_date LIMIT ?
+        ''', (now.isoformat(), max_rows))
+        fresh = [_row(values) for values in cursor.fetchall()]
+        # Most recently expired first, so long-forgotten leftovers are the ones dropped
+        cursor.execute(f'''
+            SELECT {columns} FROM purchases
+            WHERE consumed = 0 AND expiry_date <= ?
+            ORDER BY expiry_date DESC LIMIT ?
+        ''', (now.isoformat(), max_rows))
+        expired = _by_expiry(_row(values) for values in cursor.fetchall())
+        conn.close()
+        return cls(recent, fresh, expired, version, max_rows, now)
+
+    def recent(self):
+        """Purchases, newest first"""
+        return self._recent
+
+    def fresh(self, now=None):
+        """Unconsumed purchases that have not expired yet, soonest expiry first"""
+        now = now or datetime.now()
+        return [r for r in self._fresh if r['expires_at'] > now]
+
+    def expiring(self, days=3, now=None):
+        """Unconsumed purchases expiring within `days` (including already expired)"""
+        cutoff = (now or datetime.now()) + timedelta(days=days)
+        expiring = list(self._expired)
+        for r in self._fresh:
+            if r['expires_at'] > cutoff:
+                break
+            expiring.append(r)
+        return expiring
+
+    def add(self, values):
+        """Patch in a newly inserted purchase, returning False if it must be reloaded instead"""
+        row = _row(values)
+        # A reload that raced the insert may already hold this row
+        if any(r['id'] == row['id'] for r in self._recent):
+            return True
+        self._recent = ([row] + self._recent)[:self.max_rows]
+        if row['consumed']:
+            return True
+        if row['expires_at'] > self.loaded_at:
+            self._fresh = _by_expiry(self._fresh + [row])[:self.max_rows]
+        else:
+            self._expired = _by_expiry(self._expired + [row])[-self.max_rows:]
+        return True
+
+    def mark_consumed(self, item_id):
+        """Patch a purchase that was marked as consumed, returning False if it must be reloaded instead"""
+        self._recent = [dict(r, consumed=1) if r['id'] == item_id else r for r in self._recent]
+        for view in ('_fresh', '_expired'):
+            rows = getattr(self, view)
+            remaining = [r for r in rows if r['id'] != item_id]
+            # A full view may have rows waiting in SQLite to take the freed slot
+            if len(remaining) < len(rows) == self.max_rows:
+                return False
+            setattr(self, view, remaining)
+        return True
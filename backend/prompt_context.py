@@ -0,0 +1,108 @@
+from collections import Counter
+from datetime import datetime
+import math
+import re
+
+# Rough tokenizer proxy: words and standalone punctuation each count as a token,
+# long words are split roughly every 4 characters like a BPE vocabulary would
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+CHARS_PER_TOKEN = 4
+
+# Qwen3 soft switch that turns off the <think> section for a single turn
+NO_THINK_SUFFIX = "/no_think"
+
+
+def estimate_tokens(text):
+    """Estimate how many model tokens a piece of text will use"""
+    if not text:
+        return 0
+    tokens = 0
+    for piece in _TOKEN_PATTERN.findall(text):
+        tokens += max(1, -(-len(piece) // CHARS_PER_TOKEN))
+    return tokens
+
+
+def _as_datetime(value):
+    """Accept pre-parsed datetimes as well as ISO strings from the database"""
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
+class PromptContextBuilder:
+    """Ranks inventory rows by relevance and packs them into a token budget"""
+
+    def __init__(self, now=None, recency_weight=1.0, urgency_weight=1.0, frequency_weight=1.0):
+        self.now = now or datetime.now()
+        self.recency_weight = recency_weight
+        self.urgency_weight = urgency_weight
+        self.frequency_weight = frequency_weight
+
+    def days_since(self, date):
+        return (self.now - _as_datetime(date)).days
+
+    def days_until(self, date):
+        return (_as_datetime(date) - self.now).days
+
+    def score(self, purchase, frequency):
+        """Higher score = more relevant for the prompt"""
+        score = 0.0
+        purchased = purchase.get('purchased_at') or purchase.get('purchase_date')
+        expires = purchase.get('expires_at') or purchase.get('expiry_date')
+        if purchased:
+            score += self.recency_weight / (1 + max(self.days_since(purchased), 0))
+        if expires and not purchase.get('consumed'):
+            # Already expired counts as most urgent, not as not urgent at all
+            days_left = max(self.days_until(expires), 0)
+            score += self.urgency_weight / (1 + days_left)
+        # Log-scaled so a staple bought ten times outranks a one-off bought a day later
+        score += self.frequency_weight * math.log1p(frequency)
+        return score
+
+    def rank(self, purchases):
+        """Sort purchases by recency, expiry urgency and purchase frequency"""
+        # Grouped rows carry their own purchase count; raw rows are counted here
+        counts = Counter(p['item_name'].lower() for p in purchases)
+        return sorted(
+            purchases,
+            key=lambda p: self.score(p, p.get('times_bought') or counts[p['item_name'].lower()]),
+            reverse=True
+        )
+
+    def group_by_item(self, purchases):
+        """Collapse repeat purchases into one row per item with a count"""
+        grouped = {}
+        for p in purchases:
+            key = p['item_name'].lower()
+            if key not in grouped:
+                grouped[key] = dict(p, times_bought=0)
+            row = grouped[key]
+            row['times_bought'] += 1
+            if p['purchase_date'] > row['purchase_date']:
+                row.update(p, times_bought=row['times_bought'])
+        return list(grouped.values())
+
+    def pack(self, lines, budget, separator="\n"):
+        """Take lines in order until the token budget is spent"""
+        packed = []
+        used = 0
+        separator_tokens = estimate_tokens(separator)
+        for line in lines:
+            cost = estimate_tokens(line) + (separator_tokens if packed else 0)
+            if used + cost > budget:
+                break
+            packed.append(line)
+            used += cost
+        return separator.join(packed), len(packed)
+
+    def build(self, rows, formatter, budget, separator="\n"):
+        """Format already-ranked rows and pack them, returning (text, stats)"""
+        lines = [formatter(row) for row in rows]
+        full_text = separator.join(lines)
+        text, packed = self.pack(lines, budget, separator)
+        stats = {
+            "candidates": len(lines),
+            "packed": packed,
+            "budget": budget,
+            "tokens_before": estimate_tokens(full_text),
+            "tokens_after": estimate_tokens(text)
+        }
+        return text, stats
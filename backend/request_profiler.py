@@ -0,0 +1,141 @@
+from collections import deque
+from datetime import datetime
+import cProfile
+import glob
+import hmac
+import os
+import pstats
+import random
+import threading
+
+from flask import g, request
+
+
+class RequestProfiler:
+    """Opt-in cProfile sampling of Flask requests, one pstats dump per profiled request"""
+
+    HEADER = 'X-Profile'
+    TOKEN_HEADER = 'X-Profile-Token'
+
+    def __init__(self, output_dir='data/profiles', sample_rate=0.0, max_samples=200,
+                 admin_token=None, allow_header=False):
+        self.output_dir = output_dir
+        self.sample_rate = 0.0
+        self.enabled = False
+        # Same check as the admin endpoint, so a bad PROFILE_SAMPLE_RATE fails at startup
+        self.configure(sample_rate=sample_rate)
+        # X-Profile is honoured only with the admin token, or for anyone when allow_header is set
+        self.admin_token = admin_token
+        self.allow_header = allow_header
+        self.samples = deque()
+        self.max_samples = max_samples
+        self.lock = threading.Lock()
+        self._load_existing()
+
+    def _load_existing(self):
+        """Index dumps left by earlier runs so they are reported and pruned too"""
+        paths = glob.glob(os.path.join(self.output_dir, '*', '*.prof'))
+        for path in sorted(paths, key=os.path.getmtime):
+            self.samples.append((os.path.basename(os.path.dirname(path)), path))
+        self._prune()
+
+    def init_app(self, app):
+        app.before_request(self._start)
+        app.after_request(self._stop)
+
+    def is_admin(self, headers):
+        """True when the request carries the configured admin token"""
+        token = headers.get(self.TOKEN_HEADER, '')
+        return bool(self.admin_token) and hmac.compare_digest(token.encode(), self.admin_token.encode())
+
+    def _wants_profile(self):
+        if request.headers.get(self.HEADER, '').lower() in ('1', 'true', 'yes'):
+            if self.allow_header or self.is_admin(request.headers):
+                return True
+        return self.enabled or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def _start(self):
+        if not self._wants_profile():
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already running (e.g. a concurrent request on 3.12+)
+            return
+        g.request_profile = profile
+
+    def _stop(self, response):
+        profile = g.pop('request_profile', None)
+        if profile is None:
+            return response
+        profile.disable()
+
+        endpoint = request.endpoint or 'unknown'
+        directory = os.path.join(self.output_dir, endpoint)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}.prof")
+        profile.dump_stats(path)
+        self._remember(endpoint, path)
+
+        response.headers['X-Profile-File'] = os.path.relpath(path, self.output_dir)
+        return response
+
+    def _remember(self, endpoint, path):
+        with self.lock:
+            self.samples.append((endpoint, path))
+        self._prune()
+
+    def _prune(self):
+        """Keep the most recent dumps and delete the ones that fall off the end"""
+        with self.lock:
+            expired = []
+            while len(self.samples) > self.max_samples:
+                expired.append(self.samples.popleft()[1])
+        for old_path in expired:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+    def configure(self, enabled=None, sample_rate=None):
+        if sample_rate is not None:
+            sample_rate = float(sample_rate)
+            if not 0 <= sample_rate <= 1:
+                raise ValueError(f"sample_rate is a fraction between 0 and 1 (0.05 = 5%), got {sample_rate}")
+            self.sample_rate = sample_rate
+        if enabled is not None:
+            self.enabled = bool(enabled)
+
+    def status(self):
+        with self.lock:
+            endpoints = {}
+            for endpoint, _ in self.samples:
+                endpoints[endpoint] = endpoints.get(endpoint, 0) + 1
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "output_dir": os.path.abspath(self.output_dir),
+            "samples_by_endpoint": endpoints
+        }
+
+    def top_functions(self, limit=20, endpoint=None, recent=50):
+        """Merge the most recent dumps and return the top functions by cumulative time"""
+        with self.lock:
+            paths = [path for name, path in self.samples if endpoint in (None, name)][-recent:]
+        paths = [path for path in paths if os.path.exists(path)]
+        if not paths:
+            return {"samples": 0, "functions": []}
+
+        stats = pstats.Stats(*paths)
+        rows = []
+        for (filename, line, function), (_, calls, total, cumulative, _) in stats.stats.items():
+            rows.append({
+                "function": f"{os.path.basename(filename)}:{line}({function})",
+                "calls": calls,
+                "total_time": round(total, 6),
+                "cumulative_time": round(cumulative, 6),
+                "cumulative_per_sample": round(cumulative / len(paths), 6)
+            })
+        rows.sort(key=lambda row: row["cumulative_time"], reverse=True)
+        return {"samples": len(paths), "functions": rows[:limit]}
@@ -0,0 +1,176 @@
+from collections import Counter
+import json
+import os
+import re
+
+import numpy as np
+
+CATALOG_PATH = os.path.join(os.path.dirname(__file__), 'grocery_catalog.json')
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Count given to the head-noun feature relative to one word or n-gram
+HEAD_WEIGHT = 3
+
+
+def _singular(word):
+    """Crude English singular so "apple" and "apples" share the same features"""
+    if len(word) <= 3 or word.endswith(("ss", "us", "is")):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("oes", "ches", "shes", "xes", "sses")):
+        return word[:-2]
+    if word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def _words(text):
+    return [_singular(word) for word in _WORD_PATTERN.findall(text.lower())]
+
+
+def _features(text, ngram=3, head_weight=HEAD_WEIGHT):
+    """Character n-grams of each padded (singular) word, the words themselves and the head noun"""
+    features = Counter()
+    words = _words(text)
+    for word in words:
+        features[f"w:{word}"] += 1
+        padded = f" {word} "
+        for i in range(max(1, len(padded) - ngram + 1)):
+            features[padded[i:i + ngram]] += 1
+    # The last word names what the item is ("rice milk" is milk, "apple juice" is juice)
+    if words:
+        features[f"h:{words[-1]}"] += head_weight
+    return features
+
+
+class SimilarityIndex:
+    """In-memory TF-IDF index over grocery names, queried by cosine similarity"""
+
+    def __init__(self, entries):
+        self.entries = entries
+        documents = [_features(entry['name']) for entry in entries]
+        # Words the catalogue tells items apart by ("rice", "frozen", "chocolate")
+        self.known_words = {word for entry in entries for word in _words(entry['name'])}
+
+        self.vocabulary = {}
+        for features in documents:
+            for feature in features:
+                self.vocabulary.setdefault(feature, len(self.vocabulary))
+
+        document_frequency = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for features in documents:
+            for feature in features:
+                document_frequency[self.vocabulary[feature]] += 1
+        self.idf = np.log((1 + len(documents)) / (1 + document_frequency)) + 1
+
+        # Rows are L2-normalised, so a dot product with a normalised query is the cosine
+        self.matrix = np.zeros((len(documents), len(self.vocabulary)), dtype=np.float32)
+        for row, features in enumerate(documents):
+            for feature, count in features.items():
+                self.matrix[row, self.vocabulary[feature]] = count
+        self.matrix *= self.idf
+        norms = np.linalg.norm(self.matrix, axis=1, keepdims=True)
+        self.matrix /= np.where(norms == 0, 1, norms)
+
+    @classmethod
+    def from_catalog(cls, path=CATALOG_PATH):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def _vectorize(self, text):
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for feature, count in _features(text).items():
+            column = self.vocabulary.get(feature)
+            if column is not None:
+                vector[column] = count
+        vector *= self.idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def search(self, text, k=5):
+        """Return up to k (entry, score) pairs, best match first"""
+        if not self.entries:
+            return []
+        scores = self.matrix @ self._vectorize(text)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.entries[i], float(scores[i])) for i in top if scores[i] > 0]
+
+    def nearest(self, text, min_score=0.0, min_margin=0.0, field='category'):
+        """Best (entry, score), with entry None when the score is below min_score
+        or a runner-up with a different value of field is within min_margin of it"""
+        matches = self.search(text, k=5)
+        if not matches:
+            return None, 0.0
+        entry, score = matches[0]
+        if score < min_score or not self._modifiers_agree(text, entry):
+            return None, score
+        # An ambiguous name ("swiss cheese") sits between entries that would give
+        # different answers; near-ties that agree on field are still a clear answer
+        for other, other_score in matches[1:]:
+            if other[field] != entry[field] and score - other_score < min_margin:
+                return None, score
+        return entry, score
+
+    def _modifiers_agree(self, text, entry):
+        """Reject matches that only share the head noun with the query.
+
+        "tomato sauce" is not "soy sauce" (the entry's modifier is missing), and
+        "rice cakes" is not "cake" (the query adds a word the catalogue knows, so
+        it most likely names a different item).
+        """
+        query = set(_words(text))
+        entry_words = _words(entry['name'])
+        modifiers = set(entry_words[:-1])
+        if modifiers and not modifiers & query:
+            return False
+        return not (query - set(entry_words)) & self.known_words
+
+
+EVAL_PATH = os.path.join(os.path.dirname(__file__), 'catalog_eval.json')
+
+
+def calibrate(index, cases, field, thresholds, min_margin=0.0):
+    """Precision and coverage of local answers at each threshold.
+
+    field is "category" (right if the match has that category) or "swaps_from"
+    (right only if the match is that exact entry; None means defer to the model).
+    Coverage is the share of names answered locally.
+    """
+    report = []
+    for threshold in thresholds:
+        answered = correct = 0
+        for case in cases:
+            entry, _ = index.nearest(case['name'], threshold, min_margin,
+                                     'category' if field == "category" else 'swaps')
+            # Entries without swaps defer to the model, just like no match
+            if entry is None or (field == "swaps_from" and not entry['swaps']):
+                continue
+            answered += 1
+            if field == "category":
+                correct += entry['category'] == case['category']
+            else:
+                correct += entry['name'] == case['swaps_from']
+        report.append({
+            "threshold": threshold,
+            "precision": correct / answered if answered else 1.0,
+            "coverage": answered / len(cases)
+        })
+    return report
+
+
+if __name__ == '__main__':
+    import sys
+
+    margin = float(sys.argv[1]) if len(sys.argv) > 1 else 0.0
+    index = SimilarityIndex.from_catalog()
+    with open(EVAL_PATH, encoding='utf-8') as f:
+        cases = json.load(f)
+    thresholds = [round(0.4 + 0.05 * i, 2) for i in range(11)]
+    for field in ("category", "swaps_from"):
+        print(f"{field} (margin {margin}, {len(cases)} names)")
+        for row in calibrate(index, cases, field, thresholds, margin):
+            print(f"  >= {row['threshold']:.2f}  precision {row['precision']:.2f}  coverage {row['coverage']:.2f}")
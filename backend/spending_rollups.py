@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+
+GRANULARITIES = ("week", "month")
+
+# SQLite expressions mapping a purchase_date to the start of its period
+_PERIOD_SQL = {
+    "week": "date(purchase_date, '-6 days', 'weekday 1')",
+    "month": "substr(purchase_date, 1, 7) || '-01'"
+}
+
+
+def create_tables(cursor):
+    """Create the rollup table, keyed so a range of periods is one index scan"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS spending_rollups (
+            granularity TEXT NOT NULL,
+            period TEXT NOT NULL,
+            category TEXT NOT NULL,
+            total REAL NOT NULL DEFAULT 0,
+            items INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (granularity, period, category)
+        ) WITHOUT ROWID
+    ''')
+
+
+def period_start(value, granularity):
+    """Return the ISO date (YYYY-MM-DD) of the period containing value"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    day = value.date() if isinstance(value, datetime) else value
+    if granularity == "week":
+        return (day - timedelta(days=day.weekday())).isoformat()
+    if granularity == "month":
+        return day.replace(day=1).isoformat()
+    raise ValueError(f"Unknown granularity: {granularity}")
+
+
+def _aggregate_sql(granularity, where=""):
+    """SELECT producing (granularity, period, category, total, items) from purchases"""
+    return f'''
+        SELECT ?, {_PERIOD_SQL[granularity]}, COALESCE(category, 'Other'),
+               SUM(unit_price * COALESCE(quantity, 0)), COUNT(*)
+        FROM purchases
+        WHERE unit_price IS NOT NULL {where}
+        GROUP BY 2, 3
+    '''
+
+
+def record_purchase(cursor, purchase_id):
+    """Add one stored purchase to every rollup, inside the caller's transaction"""
+    # Read the amount back from the row so it matches rebuild() whatever types the caller sent
+    for granularity in GRANULARITIES:
+        cursor.execute(f'''
+            INSERT INTO spending_rollups (granularity, period, category, total, items)
+            {_aggregate_sql(granularity, "AND id = ?")}
+            ON CONFLICT (granularity, period, category)
+            DO UPDATE SET total = total + excluded.total, items = items + excluded.items
+        ''', (granularity, purchase_id))
+
+
+def rebuild(cursor):
+    """Recompute all rollups from the purchases table in one pass per granularity"""
+    cursor.execute('DELETE FROM spending_rollups')
+    for granularity in GRANULARITIES:
+        cursor.execute(f'''
+            INSERT INTO spending_rollups (granularity, period, category, total, items)
+            {_aggregate_sql(granularity)}
+        ''', (granularity,))
+
+
+def mismatches(cursor):
+    """Rollup rows that differ from a fresh aggregate of purchases (empty when in sync)"""
+    expected = " UNION ALL ".join(_aggregate_sql(granularity) for granularity in GRANULARITIES)
+    cursor.execute(f'''
+        WITH expected (granularity, period, category, total, items) AS ({expected}),
+        stored AS (SELECT granularity, period, category, ROUND(total, 6), items FROM spending_rollups),
+        fresh AS (SELECT granularity, period, category, ROUND(total, 6), items FROM expected)
+        SELECT * FROM (SELECT * FROM stored EXCEPT SELECT * FROM fresh)
+        UNION ALL
+        SELECT * FROM (SELECT * FROM fresh EXCEPT SELECT * FROM stored)
+    ''', GRANULARITIES)
+    return cursor.fetchall()
+
+
+def query(cursor, granularity, start, end, category=None):
+    """Read rollup rows for periods starting in [start, end]"""
+    sql = '''
+        SELECT period, category, total, items
+        FROM spending_rollups
+        WHERE granularity = ? AND period BETWEEN ? AND ?
+    '''
+    params = [granularity, start, end]
+    if category:
+        sql += ' AND category = ?'
+        params.append(category)
+    cursor.execute(sql + ' ORDER BY period, category', params)
+    return [
+        {"period": period, "category": cat, "total": round(total, 2), "items": items}
+        for period, cat, total, items in cursor.fetchall()
+    ]
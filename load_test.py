@@ -0,0 +1,265 @@
+import argparse
+import ast
+import contextlib
+import math
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+# ai_logs.query_type -> (HTTP method, endpoint)
+ENDPOINTS = {
+    "predict_missing": ("GET", "/api/predict"),
+    "healthy_alternatives": ("POST", "/api/alternatives"),
+    "expiring_items": ("GET", "/api/expiring"),
+    "shopping_list": ("POST", "/api/shopping-list"),
+    "meal_planning": ("GET", "/api/meal-ideas"),
+    "chat": ("POST", "/api/chat")
+}
+
+# Used when there is no recorded traffic to shape the synthetic mix
+DEFAULT_MIX = {
+    "chat": 0.35,
+    "predict_missing": 0.15,
+    "meal_planning": 0.15,
+    "expiring_items": 0.15,
+    "healthy_alternatives": 0.1,
+    "shopping_list": 0.1
+}
+
+SAMPLE_INPUTS = {
+    "healthy_alternatives": ["white bread", "soda", "chips", "whole milk", "sugar"],
+    "shopping_list": [str(["milk", "eggs", "bread"]), str(["chicken", "rice", "spinach"])],
+    "chat": ["What should I cook tonight?", "Which items expire first?", "How can I spend less on snacks?"]
+}
+
+
+class StubModel:
+    """Stand-in for the Bytez model with log-normal latency and injectable failures"""
+
+    def __init__(self, median_ms=800, sigma=0.5, error_rate=0.0):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.local = threading.local()
+
+    def run(self, messages, *args, **kwargs):
+        time.sleep(random.lognormvariate(math.log(self.median_ms / 1000), self.sigma))
+        if random.random() < self.error_rate:
+            self.local.failed = True
+            return StubResponse(None, "stub model error")
+        return StubResponse({"role": "assistant", "content": "Stub answer: buy milk, eggs and spinach."}, None)
+
+
+class StubResponse:
+    def __init__(self, output, error):
+        self.output = output
+        self.error = error
+
+
+def build_request(query_type, user_input):
+    """Turn one ai_logs row into (method, path, json body)"""
+    method, path = ENDPOINTS[query_type]
+    if query_type == "healthy_alternatives":
+        return method, path, {"item": user_input or "bread"}
+    if query_type == "chat":
+        return method, path, {"query": user_input or "What should I buy?"}
+    if query_type == "shopping_list":
+        try:
+            items = ast.literal_eval(user_input)
+        except (ValueError, SyntaxError):
+            items = [item.strip() for item in (user_input or "").split(",") if item.strip()]
+        return method, path, {"items": list(items) or ["milk"]}
+    return method, path, None
+
+
+def load_trace(db_path, source, count):
+    """Recorded ai_logs in order, or a synthetic mix with the same shape"""
+    if not os.path.exists(db_path):
+        if source == "logs":
+            raise SystemExit(f"Database not found: {db_path}")
+        return synthetic_trace(DEFAULT_MIX, count)
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    placeholders = ", ".join("?" for _ in ENDPOINTS)
+
+    if source == "logs":
+        cursor.execute(f'''
+            SELECT query_type, user_input FROM ai_logs
+            WHERE query_type IN ({placeholders}) ORDER BY id LIMIT ?
+        ''', (*ENDPOINTS, count))
+        trace = cursor.fetchall()
+        conn.close()
+        if not trace:
+            raise SystemExit("No replayable ai_logs found, use --source synthetic")
+        # Loop the recording if more requests were asked for than were logged
+        return [trace[i % len(trace)] for i in range(count)]
+
+    cursor.execute(f'''
+        SELECT query_type, COUNT(*) FROM ai_logs
+        WHERE query_type IN ({placeholders}) GROUP BY query_type
+    ''', tuple(ENDPOINTS))
+    mix = dict(cursor.fetchall()) or DEFAULT_MIX
+    conn.close()
+    return synthetic_trace(mix, count)
+
+
+def synthetic_trace(mix, count):
+    """Sample request types in proportion to the mix, with canned inputs"""
+    query_types = list(mix)
+    weights = [mix[q] for q in query_types]
+    trace = []
+    for query_type in random.choices(query_types, weights=weights, k=count):
+        trace.append((query_type, random.choice(SAMPLE_INPUTS.get(query_type, [None]))))
+    return trace
+
+
+def make_in_process_sender(db_path, stub):
+    """Send requests through the Flask test client against a scratch copy of the database"""
+    scratch_dir = tempfile.mkdtemp(prefix="grocery-load-")
+    scratch_db = os.path.join(scratch_dir, "grocery.db")
+    if os.path.exists(db_path):
+        shutil.copy(db_path, scratch_db)
+
+    # Point the app at the scratch copy before importing it, so the live
+    # database is never opened or migrated
+    os.environ['GROCERY_DB_PATH'] = scratch_db
+    import app as app_module
+
+    app_module.assistant.model = stub
+    client = app_module.app.test_client()
+
+    def send(method, path, body):
+        # The test client handles the request on this thread, so the stub's
+        # thread-local flag tells us whether this request hit a fallback
+        stub.local.failed = False
+        response = client.open(path, method=method, json=body)
+        return response.status_code, stub.local.failed
+
+    return send, lambda: shutil.rmtree(scratch_dir, ignore_errors=True)
+
+
+def make_http_sender(base_url, timeout):
+    """Send requests to a running server; fallbacks are not observable from outside"""
+    import requests
+
+    session = requests.Session()
+
+    def send(method, path, body):
+        response = session.request(method, base_url.rstrip("/") + path, json=body, timeout=timeout)
+        return response.status_code, None
+
+    return send, session.close
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[rank]
+
+
+def run_load(trace, send, concurrency, rate):
+    """Replay the trace, open-loop at `rate` req/s or closed-loop when rate is 0"""
+    results = []
+    lock = threading.Lock()
+
+    def fire(query_type, user_input, scheduled):
+        # Open loop: latency counts from the scheduled arrival, so queueing shows up in it.
+        # Closed loop: every request is queued up front, so count from when it starts.
+        scheduled = scheduled or time.perf_counter()
+        method, path, body = build_request(query_type, user_input)
+        try:
+            status, fallback = send(method, path, body)
+        except Exception:
+            status, fallback = None, None
+        with lock:
+            results.append((path, status, fallback, time.perf_counter() - scheduled))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        arrival = started
+        for query_type, user_input in trace:
+            if rate > 0:
+                arrival += random.expovariate(rate)
+                delay = arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            pool.submit(fire, query_type, user_input, arrival if rate > 0 else None)
+    return results, time.perf_counter() - started
+
+
+def report(results, elapsed):
+    by_endpoint = defaultdict(list)
+    for row in results:
+        by_endpoint[row[0]].append(row)
+
+    total = len(results)
+    print(f"\nRequests: {total}  Elapsed: {elapsed:.2f}s  Throughput: {total / elapsed:.2f} req/s\n")
+    print(f"{'endpoint':<22}{'count':>7}{'p50 ms':>10}{'p99 ms':>10}{'errors':>9}{'fallback':>10}")
+    print("-" * 68)
+    for path in sorted(by_endpoint):
+        rows = by_endpoint[path]
+        latencies = sorted(row[3] * 1000 for row in rows)
+        errors = sum(1 for row in rows if row[1] is None or row[1] >= 400)
+        observed = [row[2] for row in rows if row[2] is not None]
+        fallback = f"{sum(observed) / len(observed):.1%}" if observed else "n/a"
+        print(f"{path:<22}{len(rows):>7}{percentile(latencies, 50):>10.1f}{percentile(latencies, 99):>10.1f}"
+              f"{errors / len(rows):>9.1%}{fallback:>10}")
+
+    statuses = Counter(row[1] for row in results)
+    print(f"\nStatus codes: {dict(statuses)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded ai_logs traffic against the grocery API")
+    parser.add_argument("--db", default=os.environ.get('GROCERY_DB_PATH', '../data/grocery.db'),
+                        help="Database holding the ai_logs trace (defaults to the one the app uses "
+                             "when started from the current directory)")
+    parser.add_argument("--source", choices=["logs", "synthetic"], default="logs")
+    parser.add_argument("--requests", type=int, default=200, help="Number of requests to send")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent in-flight requests")
+    parser.add_argument("--rate", type=float, default=0, help="Arrival rate in req/s (0 = as fast as possible)")
+    parser.add_argument("--url", help="Target a running server instead of the in-process app")
+    parser.add_argument("--timeout", type=float, default=30, help="HTTP timeout in seconds (--url only)")
+    parser.add_argument("--model-latency-ms", type=float, default=800, help="Median stub model latency")
+    parser.add_argument("--model-latency-sigma", type=float, default=0.5, help="Log-normal spread of stub latency")
+    parser.add_argument("--model-error-rate", type=float, default=0.02, help="Fraction of stub calls that fail")
+    parser.add_argument("--seed", type=int, help="Random seed for repeatable runs")
+    args = parser.parse_args(argv)
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    trace = load_trace(args.db, args.source, args.requests)
+    print(f"🔁 Replaying {len(trace)} requests ({args.source}), mix: "
+          f"{dict(Counter(query_type for query_type, _ in trace))}")
+
+    if args.url:
+        send, cleanup = make_http_sender(args.url, args.timeout)
+    else:
+        stub = StubModel(args.model_latency_ms, args.model_latency_sigma, args.model_error_rate)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            send, cleanup = make_in_process_sender(args.db, stub)
+
+    try:
+        # The app prints debug output for every model call; keep the report readable
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            results, elapsed = run_load(trace, send, args.concurrency, args.rate)
+    finally:
+        cleanup()
+
+    report(results, elapsed)
+
+
+if __name__ == "__main__":
+    main()